@@ -5,12 +5,55 @@ Contains only chunk_text() and a simplified version of process_article() for dem
 """
 
 import argparse
-import mwparserfromhell
+import atexit
+import threading
+
+from mwparserfromhell import parse as _mwparse
 from tqdm import tqdm
-import time
 import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 
+# Per-process cache of DuckDB connections keyed by database path. Opening a
+# file connection per article re-runs catalog setup and pays checkpoint
+# overhead on every close; caching amortizes that over all articles a
+# worker processes.
+_conn_cache = {}
+
+
+def get_conn(db_filename, init_sql=None, read_only=False):
+    """Return a cached DuckDB connection for db_filename, opening on first use.
+
+    init_sql, if given, is executed only when the connection is first opened
+    (e.g. CREATE TABLE IF NOT EXISTS for output tables). Shared lookup
+    databases must be opened with read_only=True: a read-write connection
+    holds DuckDB's exclusive file lock for as long as it stays cached, which
+    would block every other worker.
+    """
+    conn = _conn_cache.get(db_filename)
+    if conn is None:
+        conn = duckdb.connect(str(db_filename), read_only=read_only)
+        if init_sql:
+            conn.execute(init_sql)
+        _conn_cache[db_filename] = conn
+    return conn
+
+
+def close_cached_conns():
+    """Close all cached connections, checkpointing any pending WAL.
+
+    Forked pool workers exit via os._exit and skip atexit, so callers that
+    finish a file's output database must invoke this explicitly rather than
+    relying on the interpreter-exit hook.
+    """
+    for conn in _conn_cache.values():
+        conn.close()
+    _conn_cache.clear()
+
+
+atexit.register(close_cached_conns)
+
 
 def extract_links(docid, title, text, page_meta_db, input_filename):
     """Extract links from a single article and store link graph in DuckDB table"""
@@ -18,23 +61,22 @@ def extract_links(docid, title, text, page_meta_db, input_filename):
     input_path = Path(input_filename)
     db_filename = f"{input_path.stem}_linkgraph.duckdb"
 
-    # Connect to page_meta.duckdb for docid lookup
-    meta_conn = duckdb.connect(page_meta_db)
-    # Connect to link graph DB
-    link_conn = duckdb.connect(str(db_filename))
-
-    # Create table for storing links
-    link_conn.execute(
-        """
+    # Connect to page_meta.duckdb for docid lookup. Read-only so concurrent
+    # workers can share the file instead of fighting over its write lock
+    meta_conn = get_conn(page_meta_db, read_only=True)
+    # Connect to link graph DB, creating the links table on first open
+    link_conn = get_conn(
+        db_filename,
+        init_sql="""
         CREATE TABLE IF NOT EXISTS links (
             source INTEGER,
             target INTEGER
         )
-        """
+        """,
     )
 
     # Parse MediaWiki markup
-    parsed_code = mwparserfromhell.parse(text)
+    parsed_code = _mwparse(text)
     wikilinks = parsed_code.filter_wikilinks()
     targets = set()
     for link in wikilinks:
@@ -65,75 +107,180 @@ def extract_links(docid, title, text, page_meta_db, input_filename):
         )
 
     print(f"Extracted {len(targets)} links from '{title}' (docid={docid})")
-    meta_conn.close()
-    link_conn.close()
+
+
+def _chunk_offsets(data, max_bytes):
+    """Compute chunk boundaries as (start, end) byte offset pairs.
+
+    Scans the UTF-8 encoded text for sentence ends (runs of ., !, ? plus
+    trailing whitespace), packing whole sentences into chunks of at most
+    max_bytes and falling back to word boundaries for oversized sentences.
+    Only integer indexing and comparisons are used so the loop compiles
+    under numba's nopython mode; the scanned bytes are all ASCII, so
+    boundaries always fall on UTF-8 character boundaries.
+    """
+    n = len(data)
+    offsets = []
+    chunk_start = 0
+    i = 0
+
+    # Leading terminator bytes belong to the first chunk
+    while i < n and (data[i] == 0x2E or data[i] == 0x21 or data[i] == 0x3F):
+        i += 1
+
+    while i < n:
+        s_start = i
+        while i < n and not (data[i] == 0x2E or data[i] == 0x21 or data[i] == 0x3F):
+            i += 1
+        while i < n and (data[i] == 0x2E or data[i] == 0x21 or data[i] == 0x3F):
+            i += 1
+        while i < n and (data[i] == 0x20 or (0x09 <= data[i] <= 0x0D)):
+            i += 1
+        s_end = i
+
+        if s_end - chunk_start <= max_bytes:
+            # Sentence fits in the current chunk
+            continue
+        if s_start > chunk_start:
+            offsets.append((chunk_start, s_start))
+            chunk_start = s_start
+        if s_end - chunk_start > max_bytes:
+            # Single sentence is too long, split by words
+            j = s_start
+            while j < s_end and (data[j] == 0x20 or (0x09 <= data[j] <= 0x0D)):
+                j += 1
+            while j < s_end:
+                w_start = j
+                while j < s_end and not (data[j] == 0x20 or (0x09 <= data[j] <= 0x0D)):
+                    j += 1
+                while j < s_end and (data[j] == 0x20 or (0x09 <= data[j] <= 0x0D)):
+                    j += 1
+                if j - chunk_start > max_bytes and w_start > chunk_start:
+                    offsets.append((chunk_start, w_start))
+                    chunk_start = w_start
+            # Whatever remains of the sentence starts the next chunk
+
+    offsets.append((chunk_start, n))
+    return offsets
+
+
+try:
+    import numpy as np
+    from numba import njit
+
+    _chunk_offsets_jit = njit(cache=True)(_chunk_offsets)
+
+    def _chunk_offsets(data, max_bytes):  # noqa: F811
+        return _chunk_offsets_jit(np.frombuffer(data, dtype=np.uint8), max_bytes)
+
+except ImportError:
+    # Pure-Python fallback: the scan above works directly on bytes
+    pass
 
 
 def chunk_text(text, max_bytes):
     """Break text into chunks of maximum max_bytes size"""
-    chunks = []
-    text_bytes = text.encode("utf-8")
+    data = text.encode("utf-8")
 
-    if len(text_bytes) <= max_bytes:
+    if len(data) <= max_bytes:
         return [text]
 
-    # Split by sentences first to try to maintain coherence
-    sentences = text.split(". ")
-    current_chunk = ""
-
-    for sentence in sentences:
-        sentence_with_period = (
-            sentence + ". " if sentence != sentences[-1] else sentence
-        )
-        test_chunk = current_chunk + sentence_with_period
-
-        if len(test_chunk.encode("utf-8")) <= max_bytes:
-            current_chunk = test_chunk
-        else:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = sentence_with_period
-            else:
-                # Single sentence is too long, split by words
-                words = sentence.split()
-                for word in words:
-                    test_chunk = current_chunk + word + " "
-                    if len(test_chunk.encode("utf-8")) <= max_bytes:
-                        current_chunk = test_chunk
-                    else:
-                        if current_chunk:
-                            chunks.append(current_chunk.strip())
-                        current_chunk = word + " "
-
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    chunks = []
+    for start, end in _chunk_offsets(data, max_bytes):
+        chunk = data[start:end].decode("utf-8").strip()
+        if chunk:
+            chunks.append(chunk)
 
     return chunks
 
 
-def extract_infobox(docid, title, text, input_filename):
-    """Extract infobox data from a single article and store in DuckDB table"""
-    # Create DuckDB filename based on input parquet filename
-    input_path = Path(input_filename)
-    db_filename = f"{input_path.stem}_infobox.duckdb"
+_CHUNK_SCHEMA = pa.schema(
+    [
+        ("docid", pa.int64()),
+        ("chunk_idx", pa.int32()),
+        ("bytes", pa.int32()),
+        ("text", pa.large_string()),
+    ]
+)
 
-    # Create DuckDB connection and table
-    conn = duckdb.connect(str(db_filename))
 
-    # Create table for storing infobox data
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS infobox_data (
-            docid INTEGER,
-            key VARCHAR,
-            value VARCHAR
+class ChunkWriter:
+    """Streams article chunks to a parquet file in buffered column batches.
+
+    Rows are buffered and written as a table every buffer_rows chunks, so the
+    per-chunk cost is a few list appends instead of text I/O, and downstream
+    consumers get a columnar file instead of captured stdout. add() and
+    close() are thread-safe so the single-process scan can share a writer
+    per input file across its worker threads.
+    """
+
+    def __init__(self, out_filename, buffer_rows=4096):
+        self._writer = pq.ParquetWriter(out_filename, _CHUNK_SCHEMA)
+        self._buffer_rows = buffer_rows
+        self._lock = threading.Lock()
+        self._docids = []
+        self._chunk_idxs = []
+        self._sizes = []
+        self._texts = []
+
+    def add(self, docid, chunk_idx, text):
+        with self._lock:
+            self._docids.append(docid)
+            self._chunk_idxs.append(chunk_idx)
+            self._sizes.append(len(text.encode("utf-8")))
+            self._texts.append(text)
+            if len(self._docids) >= self._buffer_rows:
+                self._flush()
+
+    def _flush(self):
+        if not self._docids:
+            return
+        table = pa.table(
+            {
+                "docid": self._docids,
+                "chunk_idx": self._chunk_idxs,
+                "bytes": self._sizes,
+                "text": self._texts,
+            },
+            schema=_CHUNK_SCHEMA,
         )
+        self._writer.write_table(table)
+        self._docids = []
+        self._chunk_idxs = []
+        self._sizes = []
+        self._texts = []
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._writer.close()
+
+
+# Infobox rows buffered per input file, written out in one shot by
+# write_infobox_parquet(). Appending to a physical DuckDB file per article
+# pays a WAL commit each time; a single sequential parquet write at the end
+# of the file avoids that and gives downstream consumers a columnar file
+# they can query directly.
+_infobox_buffers = {}
+
+
+def extract_infobox(docid, title, text, input_filename):
+    """Extract infobox data from a single article, buffering rows per input file.
+
+    Rows accumulate in memory and are written as a parquet file by
+    write_infobox_parquet() once the whole input file has been processed.
     """
-    )
+    # Register the buffer before any early return so write_infobox_parquet
+    # can tell "file had no infoboxes" apart from "key was never buffered"
+    rows = _infobox_buffers.setdefault(input_filename, [])
 
-    # Parse MediaWiki markup and strip formatting
-    parsed_code = mwparserfromhell.parse(text)
-    parsed_text = parsed_code.strip_code().strip()
+    # Plain substring scan (C-level memmem) to skip the tokenizer entirely
+    # for the majority of articles that carry no infobox
+    if "{{Infobox" not in text:
+        return
+
+    # Parse MediaWiki markup
+    parsed_code = _mwparse(text)
     templates = parsed_code.filter_templates()
 
     for template in templates:
@@ -141,95 +288,249 @@ def extract_infobox(docid, title, text, input_filename):
             # Extract parameters from the infobox
             for param in template.params:
                 param_name = param.name.strip()
-                param_value = param.value.strip()
-                # Remove wikitext markup for cleaner output (optional)
-                param_value = mwparserfromhell.parse(param_value).strip_code()
-
-                # Insert into DuckDB table
-                conn.execute(
-                    """
-                    INSERT INTO infobox_data (docid, key, value)
-                    VALUES (?, ?, ?)
-                """,
-                    [docid, param_name, param_value],
-                )
+                # Most infobox values are plain text; only run the node walk
+                # in strip_code when the value actually contains markup
+                # (templates, links/ext-links, tags, bold/italic quotes)
+                param_value = str(param.value).strip()
+                if (
+                    "{{" in param_value
+                    or "[" in param_value
+                    or "<" in param_value
+                    or "''" in param_value
+                    or "&" in param_value
+                ):
+                    param_value = param.value.strip_code().strip()
+                rows.append((docid, param_name, param_value))
+
+
+def write_infobox_parquet(input_filename):
+    """Write the infobox rows buffered for input_filename to a parquet file."""
+    rows = _infobox_buffers.pop(input_filename, None)
+    if rows is None:
+        # extract_infobox registers a buffer for every file it sees, so a
+        # missing key means the caller's filename doesn't match the one the
+        # rows were buffered under
+        print(f"Warning: no infobox rows buffered for {input_filename}")
+        return
+    if not rows:
+        return
 
-    # Query and display the stored data
-    result = conn.execute(
-        """
-        SELECT key, value FROM infobox_data
-        WHERE docid = ?
-        ORDER BY key
-    """,
-        [docid],
-    ).fetchall()
+    input_path = Path(input_filename)
+    out_filename = f"{input_path.stem}_infobox.parquet"
+
+    docids, keys, values = zip(*rows)
+    table = pa.table(
+        {
+            "docid": pa.array(docids, type=pa.int32()),
+            "key": pa.array(keys, type=pa.string()),
+            "value": pa.array(values, type=pa.string()),
+        }
+    )
 
+    conn = duckdb.connect()
+    conn.register("infobox_rows", table)
+    conn.execute(
+        f"COPY infobox_rows TO '{out_filename}' (FORMAT PARQUET, COMPRESSION ZSTD)"
+    )
     conn.close()
 
 
-def process_article(docid, title, text, chunk_size=512):
-    """Process a single article and print its chunks"""
-    print(f"\n{'='*60}")
-    print(f"Processing Article: {title}")
-    print(f"Document ID: {docid}")
-    print(f"{'='*60}")
+def process_article(
+    docid, title, text, chunk_size=512, verbose=False, chunk_writer=None
+):
+    """Process a single article, printing its chunks or appending them to
+    chunk_writer when one is given."""
+    if verbose:
+        print(f"\n{'='*60}")
+        print(f"Processing Article: {title}")
+        print(f"Document ID: {docid}")
+        print(f"{'='*60}")
 
     # Parse MediaWiki markup and strip formatting
-    parsed_code = mwparserfromhell.parse(text)
+    parsed_code = _mwparse(text)
     parsed_text = parsed_code.strip_code().strip()
-    templates = parsed_code.filter_templates()
+    # Substring check gates the template filter; see extract_infobox
+    templates = parsed_code.filter_templates() if "{{Infobox" in text else []
     for template in templates:
         if template.name.startswith("Infobox"):
             infobox_data = {}
             # Extract parameters from the infobox
             for param in template.params:
                 param_name = param.name.strip()
-                param_value = param.value.strip()
-                # Remove wikitext markup for cleaner output (optional)
-                param_value = mwparserfromhell.parse(param_value).strip_code()
+                # Most infobox values are plain text; only run the node walk
+                # in strip_code when the value actually contains markup
+                # (templates, links/ext-links, tags, bold/italic quotes)
+                param_value = str(param.value).strip()
+                if (
+                    "{{" in param_value
+                    or "[" in param_value
+                    or "<" in param_value
+                    or "''" in param_value
+                    or "&" in param_value
+                ):
+                    param_value = param.value.strip_code().strip()
                 infobox_data[param_name] = param_value
 
-            # Print the parsed data
-            for key, value in infobox_data.items():
-                print(f"{key}: {value}")
+            if verbose:
+                # Print the parsed data
+                for key, value in infobox_data.items():
+                    print(f"{key}: {value}")
 
     # Generate chunks
     text_chunks = chunk_text(parsed_text, chunk_size)
 
-    # Process chunks with progress bar showing kb/sec rate
-    start_time = time.time()
     total_bytes_processed = 0
 
-    print(f"Text length: {len(parsed_text)} characters")
-    print(f"Number of chunks: {len(text_chunks)}")
-    print(f"\nProcessing chunks...")
-
-    with tqdm(text_chunks, desc="Processing chunks", unit="chunk") as pbar:
+    if verbose:
+        print(f"Text length: {len(parsed_text)} characters")
+        print(f"Number of chunks: {len(text_chunks)}")
+        print(f"\nProcessing chunks...")
+
+    if chunk_writer is not None:
+        for chunk_num, chunk in enumerate(text_chunks):
+            chunk_writer.add(docid, chunk_num, chunk)
+            total_bytes_processed += len(chunk.encode("utf-8"))
+        return text_chunks
+
+    # Per-chunk output goes through locked stdio and dominates runtime on
+    # large articles, so previews are gated behind verbose and the progress
+    # bar refreshes at most twice a second
+    with tqdm(
+        text_chunks,
+        desc="Processing chunks",
+        unit="chunk",
+        mininterval=0.5,
+        disable=not verbose,
+    ) as pbar:
         for chunk_num, chunk in enumerate(pbar):
             chunk_bytes = len(chunk.encode("utf-8"))
             total_bytes_processed += chunk_bytes
 
-            # Print chunk information
-            print(f"\n--- Chunk {chunk_num + 1} ---")
-            print(f"Size: {chunk_bytes} bytes")
-            print(f"Content preview (first 512 chars):")
-            print(chunk[:512] + ("..." if len(chunk) > 512 else ""))
-
-            # Calculate and update processing rate
-            elapsed_time = time.time() - start_time
-            if elapsed_time > 0:
-                kb_per_sec = (total_bytes_processed / 1024) / elapsed_time
-                pbar.set_postfix({"kb/sec": f"{kb_per_sec:.2f}", "bytes": chunk_bytes})
+            if verbose:
+                # Print chunk information
+                print(f"\n--- Chunk {chunk_num + 1} ---")
+                print(f"Size: {chunk_bytes} bytes")
+                print(f"Content preview (first 512 chars):")
+                print(chunk[:512] + ("..." if len(chunk) > 512 else ""))
 
-    print(f"\nSummary:")
-    print(f"Total chunks processed: {len(text_chunks)}")
     print(
-        f"Total bytes processed: {total_bytes_processed:,} bytes ({total_bytes_processed/1024:.2f} KB)"
+        f"Processed '{title}' (docid={docid}): {len(text_chunks)} chunks, "
+        f"{total_bytes_processed:,} bytes"
     )
 
     return text_chunks
 
 
+# Article scan queries, prepared once with placeholders. Filters are pushed
+# into DuckDB's parquet scan: redirects are skipped during decode, and the
+# typed page_id comparison lets the reader prune row groups via min/max
+# statistics.
+_ARTICLE_QUERY = """
+    SELECT page_id, title, text
+    FROM read_parquet(?)
+    WHERE NOT starts_with(text, '#REDIRECT')
+    AND length(text) >= ?
+"""
+
+_ARTICLE_QUERY_BY_DOCID = """
+    SELECT page_id, title, text
+    FROM read_parquet(?)
+    WHERE page_id = ?
+    AND NOT starts_with(text, '#REDIRECT')
+"""
+
+
+def run_file(
+    input_file,
+    chunk_size=512,
+    docid=0,
+    extract_infobox_data=False,
+    extract_link_graph=False,
+    page_meta_db="page_meta.duckdb",
+    verbose=False,
+    write_chunks=False,
+    min_length=256,
+    db_threads=0,
+    memory_limit=None,
+):
+    """Process all matching articles in a single parquet file.
+
+    Importable entry point so callers (e.g. parallel_chunk_extractor.py) can
+    invoke processing directly in a worker process instead of spawning a
+    fresh interpreter per file.
+    """
+    conn = duckdb.connect()
+
+    # Cap the connection's thread pool and memory. DuckDB defaults to one
+    # thread per core, so N parallel workers would otherwise oversubscribe
+    # the machine N-fold and each claim the full default memory budget.
+    if db_threads:
+        conn.execute(f"PRAGMA threads={db_threads}")
+    if memory_limit:
+        conn.execute(f"PRAGMA memory_limit='{memory_limit}'")
+
+    # Select the prepared query and bind the docid as an integer parameter.
+    # Interpolating it as a quoted string both invites SQL injection and
+    # compares an integer column against VARCHAR, which defeats row-group
+    # min/max pruning in the parquet scan.
+    if docid:
+        # An explicitly requested article is returned even if it is a stub
+        query = _ARTICLE_QUERY_BY_DOCID
+        params = [input_file, docid]
+    else:
+        query = _ARTICLE_QUERY
+        params = [input_file, min_length]
+
+    # Stream results as Arrow record batches instead of materializing a
+    # pandas DataFrame; each batch's columns are zero-copy Arrow arrays.
+    reader = conn.execute(query, params).to_arrow_reader(batch_size=1024)
+
+    chunk_writer = None
+    if write_chunks and not (extract_infobox_data or extract_link_graph):
+        chunk_writer = ChunkWriter(f"{Path(input_file).stem}_chunks.parquet")
+
+    processed = 0
+    for batch in reader:
+        page_ids = batch.column("page_id")
+        titles = batch.column("title")
+        texts = batch.column("text")
+        for article_docid, title, text in zip(page_ids, titles, texts):
+            article_docid = article_docid.as_py()
+            title = title.as_py()
+            text = text.as_py()
+            if verbose:
+                print(f"Found article: {title}")
+
+            if extract_infobox_data:
+                extract_infobox(article_docid, title, text, input_file)
+            elif extract_link_graph:
+                extract_links(article_docid, title, text, page_meta_db, input_file)
+            else:
+                process_article(
+                    article_docid, title, text, chunk_size, verbose, chunk_writer
+                )
+
+            if verbose:
+                print(f"Successfully processed document ID {article_docid}")
+            processed += 1
+
+    if chunk_writer is not None:
+        chunk_writer.close()
+
+    if extract_infobox_data and processed:
+        write_infobox_parquet(input_file)
+
+    if extract_link_graph:
+        # Close this file's linkgraph connection now: forked workers skip
+        # atexit, which would leave the database with an un-checkpointed WAL
+        close_cached_conns()
+
+    if not processed:
+        print(f"No article found with document ID {docid} (or it's a redirect page)")
+
+    conn.close()
+
+
 def main():
     """Main function to process articles from the parquet file"""
     parser = argparse.ArgumentParser(
@@ -269,6 +570,40 @@ def main():
         help="DuckDB file containing page_meta table for docid lookup (default: page_meta.duckdb)",
     )
 
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print per-chunk previews and per-article details",
+    )
+
+    parser.add_argument(
+        "--write-chunks",
+        action="store_true",
+        help="Write chunks to <input_stem>_chunks.parquet instead of printing them",
+    )
+
+    parser.add_argument(
+        "--min-length",
+        type=int,
+        default=256,
+        help="Skip articles shorter than this many characters when scanning "
+        "a whole file (default: 256)",
+    )
+
+    parser.add_argument(
+        "--db-threads",
+        type=int,
+        default=0,
+        help="Threads for the DuckDB scan (default: 0 = DuckDB's default)",
+    )
+
+    parser.add_argument(
+        "--memory-limit",
+        type=str,
+        default=None,
+        help="DuckDB memory limit for the scan, e.g. '2GB' (default: DuckDB's default)",
+    )
+
     args = parser.parse_args()
 
     print(f"Input parquet file: {args.input}")
@@ -278,45 +613,19 @@ def main():
     try:
         # Use DuckDB to query the parquet file directly for the specific docid
         print(f"\nQuerying parquet file for document ID {args.docid}...")
-        conn = duckdb.connect()
-
-        # Query for the specific document ID, excluding redirects
-        filter = f"page_id = '{args.docid}' AND" if args.docid else ""
-        query = f"""
-            SELECT page_id, title, text
-            FROM read_parquet('{args.input}')
-            WHERE
-            {filter}
-            NOT starts_with(text, '#REDIRECT')
-        """
-
-        result = conn.execute(query).df()
-
-        if result.empty:
-            print(
-                f"No article found with document ID {args.docid} (or it's a redirect page)"
-            )
-            return
-
-        # Process the found article
-        for index, row in result.iterrows():
-            docid = row["page_id"]
-            title = row["title"]
-            text = row["text"]
-            print(f"Found article: {title}")
-
-            # Process the article
-
-            if args.extract_infobox:
-                extract_infobox(docid, title, text, args.input)
-            elif args.extract_link_graph:
-                extract_links(docid, title, text, args.page_meta_db, args.input)
-            else:
-                chunks = process_article(docid, title, text, args.chunk_size)
-
-            print(f"Successfully processed document ID {docid}")
-
-        conn.close()
+        run_file(
+            args.input,
+            chunk_size=args.chunk_size,
+            docid=args.docid,
+            extract_infobox_data=args.extract_infobox,
+            extract_link_graph=args.extract_link_graph,
+            page_meta_db=args.page_meta_db,
+            verbose=args.verbose,
+            write_chunks=args.write_chunks,
+            min_length=args.min_length,
+            db_threads=args.db_threads,
+            memory_limit=args.memory_limit,
+        )
 
     except FileNotFoundError:
         print(f"Error: Could not find parquet file: {args.input}")
@@ -1,18 +1,36 @@
 #!/usr/bin/env python3
 """
-Parallel processing script to run chunk_extractor.py over multiple parquet files.
+Parallel processing script to run chunk_extractor over multiple parquet files.
 Processes all parquet files in the specified directory with configurable parallelism.
+Workers call chunk_extractor.run_file() directly so the interpreter, duckdb and
+mwparserfromhell are imported once per worker instead of once per file.
 """
 
 import argparse
+import multiprocessing
 import os
-import subprocess
+import re
 import sys
+import threading
 import time
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Tuple, Optional
 
+import duckdb
+import mwparserfromhell
+
+import chunk_extractor
+
+
+def init_worker():
+    """Warm up a worker process before it receives tasks.
+
+    Parsing a trivial string forces mwparserfromhell to load its C tokenizer
+    so the first real article doesn't pay that cost.
+    """
+    mwparserfromhell.parse("x")
+
 
 def run_chunk_extractor(
     input_file: str,
@@ -20,58 +38,190 @@ def run_chunk_extractor(
     extract_link_graph: bool = False,
     page_meta_db: Optional[str] = None,
     output_dir: Optional[str] = None,
+    write_chunks: bool = False,
+    min_length: int = 256,
+    db_threads: int = 1,
+    memory_limit: Optional[str] = "2GB",
 ) -> Tuple[str, bool, str]:
     """
-    Run chunk_extractor.py on a single parquet file.
+    Process a single parquet file in this worker process.
 
     Args:
         input_file: Path to the parquet file
         extract_infobox: Whether to extract infobox data
         output_dir: Directory where output files should be written
+        write_chunks: Whether to write chunks to a parquet file
 
     Returns:
         Tuple of (filename, success, error_message)
     """
     try:
-        cmd = ["python", "chunk_extractor.py", "--input", input_file]
-
-        if extract_infobox:
-            cmd.append("--extract-infobox")
-        if extract_link_graph:
-            cmd.append("--extract-link-graph")
-            if page_meta_db is not None:
-                cmd.extend(["--page-meta-db", page_meta_db])
-
-        # Set working directory - use output_dir if specified, otherwise script directory
-        if output_dir and (extract_infobox or extract_link_graph):
-            working_dir = output_dir
-            os.makedirs(working_dir, exist_ok=True)
+        # Set working directory - use output_dir if specified, otherwise script
+        # directory. Output files are created relative to the cwd. Workers
+        # persist across tasks, so output_dir must be an absolute path (main()
+        # resolves it) for repeated chdirs to land in the same place.
+        if output_dir and (extract_infobox or extract_link_graph or write_chunks):
+            os.makedirs(output_dir, exist_ok=True)
+            os.chdir(output_dir)
         else:
-            working_dir = os.path.dirname(os.path.abspath(__file__))
-
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=3000,
-            cwd=working_dir,
+            os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+        chunk_extractor.run_file(
+            input_file,
+            extract_infobox_data=extract_infobox,
+            extract_link_graph=extract_link_graph,
+            page_meta_db=page_meta_db or "page_meta.duckdb",
+            write_chunks=write_chunks,
+            min_length=min_length,
+            db_threads=db_threads,
+            memory_limit=memory_limit,
         )
+        return (input_file, True, "")
 
-        if result.returncode == 0:
-            return (input_file, True, "")
-        else:
-            return (
-                input_file,
-                False,
-                f"Exit code {result.returncode}: {result.stderr}",
-            )
-
-    except subprocess.TimeoutExpired:
-        return (input_file, False, "Timeout after 5 minutes")
     except Exception as e:
         return (input_file, False, str(e))
 
 
+def run_single_process(files: List[str], args) -> Tuple[int, int]:
+    """Process all parquet files through one DuckDB connection.
+
+    DuckDB parallelizes a single scan internally across row groups and
+    files (THREADS = parallelism) and steals work between them, so one
+    query over the whole file list often balances heterogeneous file sizes
+    better than one process per file. The Python-side article work runs on
+    a thread pool; for parse-heavy runs the multiprocess mode remains the
+    better fit.
+
+    Returns:
+        Tuple of (articles_processed, articles_failed)
+    """
+    if args.output_dir and (
+        args.extract_infobox or args.extract_link_graph or args.write_chunks
+    ):
+        os.makedirs(args.output_dir, exist_ok=True)
+        os.chdir(args.output_dir)
+
+    conn = duckdb.connect(config={"threads": args.parallelism})
+    if args.memory_limit:
+        conn.execute(f"PRAGMA memory_limit='{args.memory_limit}'")
+
+    # For infobox extraction, count the matching articles per file up front
+    # so each file's buffered rows can be flushed to parquet as soon as its
+    # last article is processed, instead of holding every file's rows in
+    # memory until the whole scan finishes
+    remaining_articles = {}
+    remaining_lock = threading.Lock()
+    if args.extract_infobox:
+        counts = conn.execute(
+            """
+            SELECT filename, count(*)
+            FROM read_parquet(?, filename=true)
+            WHERE NOT starts_with(text, '#REDIRECT')
+            AND length(text) >= ?
+            GROUP BY filename
+            """,
+            [files, args.min_length],
+        ).fetchall()
+        remaining_articles = dict(counts)
+
+    # filename=true tags each row with its source file so per-file outputs
+    # (e.g. <stem>_infobox.parquet) keep working across the merged scan
+    query = """
+        SELECT page_id, title, text, filename
+        FROM read_parquet(?, filename=true)
+        WHERE NOT starts_with(text, '#REDIRECT')
+        AND length(text) >= ?
+    """
+    reader = conn.execute(query, [files, args.min_length]).to_arrow_reader(
+        batch_size=1024
+    )
+
+    page_meta_db = args.page_meta_db or "page_meta.duckdb"
+
+    # One chunk writer per source file, shared across the worker threads
+    # (ChunkWriter.add is thread-safe)
+    chunk_writers = {}
+    writer_lock = threading.Lock()
+
+    def get_chunk_writer(filename):
+        with writer_lock:
+            writer = chunk_writers.get(filename)
+            if writer is None:
+                writer = chunk_extractor.ChunkWriter(
+                    f"{Path(filename).stem}_chunks.parquet"
+                )
+                chunk_writers[filename] = writer
+            return writer
+
+    def handle(row) -> bool:
+        article_docid, title, text, filename = row
+        ok = True
+        try:
+            if args.extract_infobox:
+                chunk_extractor.extract_infobox(article_docid, title, text, filename)
+            elif args.extract_link_graph:
+                chunk_extractor.extract_links(
+                    article_docid, title, text, page_meta_db, filename
+                )
+            elif args.write_chunks:
+                chunk_extractor.process_article(
+                    article_docid, title, text, chunk_writer=get_chunk_writer(filename)
+                )
+            else:
+                chunk_extractor.process_article(article_docid, title, text)
+        except Exception as e:
+            print(f"✗ docid {article_docid} ({filename}): {e}")
+            ok = False
+
+        # Flush a file's infobox rows once its last article is done; failed
+        # articles still count so a bad row can't strand the buffer
+        if args.extract_infobox:
+            with remaining_lock:
+                remaining_articles[filename] = remaining_articles.get(filename, 1) - 1
+                done = remaining_articles[filename] <= 0
+            if done:
+                chunk_extractor.write_infobox_parquet(filename)
+
+        return ok
+
+    successful = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.parallelism) as pool:
+        for batch in reader:
+            rows = zip(
+                batch.column("page_id").to_pylist(),
+                batch.column("title").to_pylist(),
+                batch.column("text").to_pylist(),
+                batch.column("filename").to_pylist(),
+            )
+            for ok in pool.map(handle, rows):
+                if ok:
+                    successful += 1
+                else:
+                    failed += 1
+
+    # Flush anything the per-file accounting missed (shouldn't happen, but
+    # don't silently drop rows if it does)
+    if args.extract_infobox:
+        for filename, count in remaining_articles.items():
+            if count > 0:
+                chunk_extractor.write_infobox_parquet(filename)
+
+    for writer in chunk_writers.values():
+        writer.close()
+
+    if args.extract_link_graph:
+        chunk_extractor.close_cached_conns()
+
+    conn.close()
+    return successful, failed
+
+
+# Matches wikipedia_en_part_001.parquet and captures the part number, so
+# one regex match both filters and extracts the sort key
+_PART_FILE_RE = re.compile(r"wikipedia_en_part_(\d+)\.parquet$")
+
+
 def find_parquet_files(directory: str) -> List[str]:
     """
     Find all parquet files matching the wikipedia_en_part_*.parquet pattern.
@@ -80,33 +230,29 @@ def find_parquet_files(directory: str) -> List[str]:
         directory: Directory to search for parquet files
 
     Returns:
-        List of absolute paths to parquet files
+        List of absolute paths to parquet files, sorted by part number
     """
-    parquet_dir = Path(directory)
-    if not parquet_dir.exists():
+    if not os.path.isdir(directory):
         raise FileNotFoundError(f"Directory not found: {directory}")
 
-    # Find all files matching the pattern
-    pattern = "wikipedia_en_part_*.parquet"
-    parquet_files = list(parquet_dir.glob(pattern))
+    # scandir avoids a Path allocation and stat per file, and the compiled
+    # regex replaces the split/int/try-except sort key
+    numbered_files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = _PART_FILE_RE.match(entry.name)
+            if match:
+                numbered_files.append((int(match.group(1)), entry.path))
 
-    if not parquet_files:
+    if not numbered_files:
         raise FileNotFoundError(
-            f"No parquet files found matching pattern {pattern} in {directory}"
+            f"No parquet files found matching pattern "
+            f"wikipedia_en_part_*.parquet in {directory}"
         )
 
-    # Sort files numerically by part number
-    def extract_part_number(filepath):
-        stem = filepath.stem  # wikipedia_en_part_001
-        parts = stem.split("_")
-        try:
-            return int(parts[-1])  # Extract the numeric part
-        except (ValueError, IndexError):
-            return 0
+    numbered_files.sort()
 
-    parquet_files.sort(key=extract_part_number)
-
-    return [str(f.absolute()) for f in parquet_files]
+    return [os.path.abspath(path) for _, path in numbered_files]
 
 
 def main():
@@ -126,6 +272,12 @@ def main():
         default=8,
         help="Number of parallel processes (default: 8)",
     )
+    parser.add_argument(
+        "--single-process",
+        action="store_true",
+        help="Scan all files with one DuckDB connection (THREADS=parallelism) "
+        "instead of one worker process per file",
+    )
     parser.add_argument(
         "--extract-infobox",
         action="store_true",
@@ -142,6 +294,29 @@ def main():
         default=None,
         help="DuckDB file containing page_meta table for docid lookup",
     )
+    parser.add_argument(
+        "--write-chunks",
+        action="store_true",
+        help="Write chunks to <parquet_filename>_chunks.parquet instead of printing",
+    )
+    parser.add_argument(
+        "--min-length",
+        type=int,
+        default=256,
+        help="Skip articles shorter than this many characters (default: 256)",
+    )
+    parser.add_argument(
+        "--db-threads",
+        type=int,
+        default=0,
+        help="DuckDB threads per worker (default: 0 = cores / parallelism)",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=str,
+        default="2GB",
+        help="DuckDB memory limit per worker (default: 2GB)",
+    )
     parser.add_argument(
         "--max-files", type=int, help="Maximum number of files to process (for testing)"
     )
@@ -164,6 +339,14 @@ def main():
 
     args = parser.parse_args()
 
+    # Resolve user-supplied paths before any worker chdirs into the output
+    # directory: workers persist across tasks, so a relative path would be
+    # re-resolved against the already-changed cwd on every subsequent file
+    if args.output_dir:
+        args.output_dir = os.path.abspath(args.output_dir)
+    if args.page_meta_db:
+        args.page_meta_db = os.path.abspath(args.page_meta_db)
+
     try:
         # Find all parquet files
         print(f"Searching for parquet files in: {args.input_dir}")
@@ -193,13 +376,15 @@ def main():
         print(f"Extract link graph: {args.extract_link_graph}")
 
         # Show output information
-        if args.extract_infobox or args.extract_link_graph:
+        if args.extract_infobox or args.extract_link_graph or args.write_chunks:
             output_dir = args.output_dir if args.output_dir else os.getcwd()
-            print(f"DuckDB files will be written to: {output_dir}")
+            print(f"Output files will be written to: {output_dir}")
             if args.extract_infobox:
-                print(f"DuckDB filename pattern: <parquet_filename>_infobox.duckdb")
+                print(f"Output filename pattern: <parquet_filename>_infobox.parquet")
             if args.extract_link_graph:
                 print(f"DuckDB filename pattern: <parquet_filename>_linkgraph.duckdb")
+            if args.write_chunks:
+                print(f"Output filename pattern: <parquet_filename>_chunks.parquet")
 
         if args.dry_run:
             print("\nDry run - files that would be processed:")
@@ -207,8 +392,8 @@ def main():
                 filename = Path(file_path).name
                 print(f"  {i+1}. {filename}")
                 if args.extract_infobox:
-                    db_name = f"{Path(file_path).stem}_infobox.duckdb"
-                    print(f"      -> {db_name}")
+                    out_name = f"{Path(file_path).stem}_infobox.parquet"
+                    print(f"      -> {out_name}")
             if len(all_files) > 10:
                 print(f"  ... and {len(all_files) - 10} more files")
             return
@@ -217,6 +402,19 @@ def main():
             print("No files to process!")
             return
 
+        if args.single_process:
+            start_time = time.time()
+            successful, failed = run_single_process(all_files, args)
+            elapsed_time = time.time() - start_time
+            print("=" * 80)
+            print(f"Processing complete!")
+            print(f"Articles processed: {successful}")
+            print(f"Failed: {failed}")
+            print(f"Total time: {elapsed_time/60:.1f} minutes")
+            if failed > 0:
+                sys.exit(1)
+            return
+
         # Process files in parallel
         start_time = time.time()
         successful = 0
@@ -225,7 +423,27 @@ def main():
         print(f"\nStarting parallel processing...")
         print("=" * 80)
 
-        with ProcessPoolExecutor(max_workers=args.parallelism) as executor:
+        # Fork workers where available (Linux/macOS): children inherit the
+        # already-imported duckdb/mwparserfromhell modules and the file list
+        # via copy-on-write instead of re-importing under spawn. Warm the
+        # tokenizer in the parent first so every child inherits it hot.
+        init_worker()
+        if "fork" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("fork")
+        else:
+            mp_context = None
+
+        # Each worker's DuckDB connection defaults to one thread per core;
+        # divide the cores among the workers instead
+        db_threads = args.db_threads or max(
+            1, (os.cpu_count() or 1) // args.parallelism
+        )
+
+        with ProcessPoolExecutor(
+            max_workers=args.parallelism,
+            mp_context=mp_context,
+            initializer=init_worker,
+        ) as executor:
             future_to_file = {
                 executor.submit(
                     run_chunk_extractor,
@@ -234,6 +452,10 @@ def main():
                     args.extract_link_graph,
                     args.page_meta_db,
                     args.output_dir,
+                    args.write_chunks,
+                    args.min_length,
+                    db_threads,
+                    args.memory_limit,
                 ): file_path
                 for file_path in all_files
             }